@@ -1,13 +1,14 @@
-import base64
 import sqlite3
+from base64 import b64decode
 from functools import partial
 from pathlib import Path
 from typing import TYPE_CHECKING, Any
 
-from PyQt6.QtCore import QModelIndex, QObject, Qt, QVariant
-from PyQt6.QtGui import QIcon
+from PyQt6.QtCore import QModelIndex, QObject, Qt, QTimer, QVariant
+from PyQt6.QtGui import QIcon, QStandardItem, QStandardItemModel
 from PyQt6.QtSql import (
     QSqlDatabase,
+    QSqlQuery,
     QSqlRelation,
     QSqlRelationalTableModel,
     QSqlTableModel,
@@ -46,6 +47,9 @@ load_translations()  # type: ignore
 if TYPE_CHECKING:
     _: Any
 
+CHECKED_VALUE = Qt.CheckState.Checked.value
+UNCHECKED_VALUE = Qt.CheckState.Unchecked.value
+
 
 class CustomLemmasDialog(QDialog):
     def __init__(
@@ -112,6 +116,8 @@ class CustomLemmasDialog(QDialog):
         for column in self.lemmas_model.hide_columns:
             self.lemmas_table.hideColumn(column)
         self.lemmas_table.horizontalHeader().setMaximumSectionSize(400)
+        # measure at most 50 rows when resizing columns
+        self.lemmas_table.horizontalHeader().setResizeContentsPrecision(50)
         self.lemmas_table.setSizeAdjustPolicy(
             QAbstractScrollArea.SizeAdjustPolicy.AdjustToContentsOnFirstShow
         )
@@ -119,7 +125,12 @@ class CustomLemmasDialog(QDialog):
 
     def init_filters(self, form_layout: QFormLayout) -> None:
         self.filter_lemma_line = QLineEdit()
-        self.filter_lemma_line.textChanged.connect(self.filter_data)
+        # wait for the user to stop typing before querying the database
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(150)
+        self.filter_timer.timeout.connect(self.filter_data)
+        self.filter_lemma_line.textChanged.connect(lambda: self.filter_timer.start())
         form_layout.addRow(_("Filter lemma"), self.filter_lemma_line)
 
         self.filter_enabled_box = QComboBox()
@@ -192,7 +203,7 @@ class CustomLemmasDialog(QDialog):
         return dialog_button_box
 
     def check_empty_kindle_gloss(self) -> None:
-        custom_db_conn = sqlite3.connect(self.db_path)
+        custom_db_conn = sqlite3.connect(self.db_path, uri=True)
         for (gloss,) in custom_db_conn.execute("SELECT short_def FROM senses LIMIT 1"):
             empty_gloss = len(gloss) == 0
         if not empty_gloss:
@@ -221,27 +232,30 @@ class CustomLemmasDialog(QDialog):
             ww_db_not_found_dialog(self)
             return
 
-        klld_conn = sqlite3.connect(klld_path)
-        for sense_id, short_def, full_def, example in klld_conn.execute(
+        # only decode glosses of senses that exist in the custom database
+        custom_db_conn.create_function(
+            "b64decode", 1, decode_klld_text, deterministic=True
+        )
+        # klld is only read, open it read-only and memory-mapped
+        klld_uri = klld_path.resolve().as_uri() + "?mode=ro&immutable=1"
+        custom_db_conn.execute("ATTACH DATABASE ? AS klld", (klld_uri,))
+        custom_db_conn.execute("PRAGMA klld.mmap_size = 268435456")
+        custom_db_conn.execute(
             """
-            SELECT senses.id, short_def, full_def, example_sentence
-            FROM lemmas JOIN senses ON lemmas.id = display_lemma_id
-            WHERE (full_def IS NOT NULL OR short_def IS NOT NULL)
-            AND lemma NOT like '-%'
+            UPDATE senses
+            SET short_def = b64decode(
+              CASE WHEN length(k.short_def) > 0 THEN k.short_def ELSE k.full_def END
+            ),
+            full_def = b64decode(k.full_def),
+            example = b64decode(k.example_sentence)
+            FROM klld.senses AS k JOIN klld.lemmas AS l ON l.id = k.display_lemma_id
+            WHERE senses.id = k.id
+            AND (k.full_def IS NOT NULL OR k.short_def IS NOT NULL)
+            AND l.lemma NOT like '-%'
             """
-        ):
-            short_def = base64.b64decode(short_def if short_def else full_def).decode(
-                "utf-8"
-            )
-            full_def = base64.b64decode(full_def).decode("utf-8") if full_def else ""
-            example = base64.b64decode(example).decode("utf-8") if example else ""
-            custom_db_conn.execute(
-                "UPDATE senses SET short_def = ?, full_def = ?, example = ? "
-                "WHERE id = ?",
-                (short_def, full_def, example, sense_id),
-            )
-        klld_conn.close()
+        )
         custom_db_conn.commit()
+        custom_db_conn.execute("DETACH DATABASE klld")
         custom_db_conn.close()
 
     def filter_data(self) -> None:
@@ -311,14 +325,24 @@ class CustomLemmasDialog(QDialog):
         prefs[f"{self.lemma_lang}_wiktionary_difficulty_limit"] = limit
 
     def enable_or_disable_words(self, enable: bool):
-        for row in range(self.lemmas_model.rowCount()):
-            record = self.lemmas_model.record(row)
-            record.setValue("enabled", int(enable))
-            self.lemmas_model.setRecord(row, record)
-        self.lemmas_model.submitAll()
+        # update the table in SQLite instead of loading every row into the model
+        relation_table = f"relTblAl_{self.lemmas_model.lemma_column}"
+        sql = (
+            f"UPDATE senses SET enabled = {int(enable)} WHERE id IN "
+            f"(SELECT senses.id FROM senses JOIN lemmas {relation_table} "
+            f"ON senses.lemma_id = {relation_table}.id"
+        )
+        if filter_sql := self.lemmas_model.filter():
+            sql += f" WHERE {filter_sql}"
+        sql += ")"
+        QSqlQuery(self.lemmas_model.database()).exec(sql)
         self.lemmas_model.select()
 
 
+def decode_klld_text(text: str | None) -> str:
+    return b64decode(text).decode("utf-8") if text else ""
+
+
 class LemmasTableModel(QSqlRelationalTableModel):
     def __init__(self, db: QSqlDatabase, is_kindle: bool) -> None:
         super().__init__(db=db)
@@ -365,14 +389,11 @@ class LemmasTableModel(QSqlRelationalTableModel):
     ) -> QVariant:
         column = index.column()
         if role == Qt.ItemDataRole.CheckStateRole and column == self.checkable_column:
-            value = self.record(index.row()).value(column)
-            return (
-                Qt.CheckState.Checked.value
-                if value == 1
-                else Qt.CheckState.Unchecked.value
-            )
+            value = super().data(index, Qt.ItemDataRole.DisplayRole)
+            return CHECKED_VALUE if value == 1 else UNCHECKED_VALUE
         elif role == Qt.ItemDataRole.ToolTipRole and column in self.tooltip_columns:
-            return self.record(index.row()).value(column)
+            # only read the hovered cell instead of building the whole row record
+            return super().data(index, Qt.ItemDataRole.DisplayRole)
         return super().data(index, role)
 
     def setData(
@@ -387,7 +408,7 @@ class LemmasTableModel(QSqlRelationalTableModel):
         if role == Qt.ItemDataRole.CheckStateRole and column == self.checkable_column:
             row = index.row()
             record = self.record(row)
-            record.setValue(column, 1 if value == Qt.CheckState.Checked.value else 0)
+            record.setValue(column, 1 if value == CHECKED_VALUE else 0)
             record.setGenerated(column, True)
             self.setRecord(row, record)
             self.dataChanged.emit(index, index, [role])
@@ -398,20 +419,22 @@ class LemmasTableModel(QSqlRelationalTableModel):
 class ComboBoxDelegate(QStyledItemDelegate):
     def __init__(self, parent, options, tooltips={}):
         super().__init__(parent)
-        self.options = options
-        self.tooltips = tooltips
+        # build the items once and share them with every editor
+        self.item_model = QStandardItemModel(self)
+        if isinstance(options, list):
+            items = [(value, str(value)) for value in options]
+        else:
+            items = list(options.items())
+        for row, (value, text) in enumerate(items):
+            item = QStandardItem(text)
+            item.setData(value, Qt.ItemDataRole.UserRole)
+            if row in tooltips:
+                item.setToolTip(tooltips[row])
+            self.item_model.appendRow(item)
 
     def createEditor(self, parent, option, index):
         comboBox = QComboBox(parent)
-        if isinstance(self.options, list):
-            for value in self.options:
-                comboBox.addItem(str(value), value)
-        elif isinstance(self.options, dict):
-            for value, text in self.options.items():
-                comboBox.addItem(text, value)
-
-        for index, text in self.tooltips.items():
-            comboBox.setItemData(index, text, Qt.ItemDataRole.ToolTipRole)
+        comboBox.setModel(self.item_model)
         comboBox.currentIndexChanged.connect(self.commit_editor)
 
         return comboBox
@@ -422,19 +445,20 @@ class ComboBoxDelegate(QStyledItemDelegate):
         self.closeEditor.emit(editor)
 
     def setEditorData(self, editor, index):
-        value = index.data(Qt.ItemDataRole.DisplayRole)
-        if isinstance(self.options, list):
-            editor.setCurrentText(str(value))
-        else:
-            editor.setCurrentText(self.options[value])
+        row = editor.findData(index.data(Qt.ItemDataRole.DisplayRole))
+        if row >= 0:
+            editor.setCurrentIndex(row)
 
     def setModelData(self, editor, model, index):
         value = editor.currentData()
         model.setData(index, value, Qt.ItemDataRole.EditRole)
 
     def paint(self, painter, option, index):
-        if isinstance(self.parent(), QAbstractItemView):
-            self.parent().openPersistentEditor(index)
+        view = self.parent()
+        if isinstance(view, QAbstractItemView) and not view.isPersistentEditorOpen(
+            index
+        ):
+            view.openPersistentEditor(index)
         super().paint(painter, option, index)
 
 
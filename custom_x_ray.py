@@ -1,7 +1,9 @@
 import json
+import os
+from bisect import bisect_left
 from typing import TYPE_CHECKING, Any
 
-from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt, QVariant
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt, QTimer, QVariant
 from PyQt6.QtGui import QIcon
 from PyQt6.QtWidgets import (
     QAbstractScrollArea,
@@ -18,7 +20,7 @@ from PyQt6.QtWidgets import (
     QVBoxLayout,
 )
 
-from .custom_lemmas import ComboBoxDelegate
+from .custom_lemmas import CHECKED_VALUE, UNCHECKED_VALUE, ComboBoxDelegate
 from .x_ray_share import get_custom_x_path
 
 load_translations()  # type: ignore
@@ -43,6 +45,18 @@ DESC_SOURCES = {
     2: _("Other MediaWiki server"),
 }
 
+# rows added to the table view each time it scrolls to the bottom
+FETCH_ROW_COUNT = 200
+
+DATA_ROLES = frozenset(
+    [
+        Qt.ItemDataRole.DisplayRole,
+        Qt.ItemDataRole.EditRole,
+        Qt.ItemDataRole.ToolTipRole,
+        Qt.ItemDataRole.CheckStateRole,
+    ]
+)
+
 
 class CustomXRayDialog(QDialog):
     def __init__(self, book_path: str, title: str, parent: Any = None) -> None:
@@ -55,24 +69,16 @@ class CustomXRayDialog(QDialog):
         self.x_ray_table.setAlternatingRowColors(True)
         self.x_ray_model = XRayTableModel(book_path)
         self.x_ray_table.setModel(self.x_ray_model)
-        self.x_ray_table.setItemDelegateForColumn(
-            1,
-            ComboBoxDelegate(
-                self.x_ray_table,
-                list(NER_LABEL_EXPLANATIONS.keys()),
-                {
-                    i: exp
-                    for i, exp in zip(
-                        range(len(NER_LABEL_EXPLANATIONS)),
-                        NER_LABEL_EXPLANATIONS.values(),
-                    )
-                },
-            ),
-        )
-        self.x_ray_table.setItemDelegateForColumn(
-            4, ComboBoxDelegate(self.x_ray_table, DESC_SOURCES)
+        self.ner_delegate = ComboBoxDelegate(
+            self.x_ray_table,
+            list(NER_LABEL_EXPLANATIONS),
+            dict(enumerate(NER_LABEL_EXPLANATIONS.values())),
         )
+        self.x_ray_table.setItemDelegateForColumn(1, self.ner_delegate)
+        self.source_delegate = ComboBoxDelegate(self.x_ray_table, DESC_SOURCES)
+        self.x_ray_table.setItemDelegateForColumn(4, self.source_delegate)
         self.x_ray_table.horizontalHeader().setMaximumSectionSize(400)
+        self.x_ray_table.horizontalHeader().setResizeContentsPrecision(50)
         self.x_ray_table.setSizeAdjustPolicy(
             QAbstractScrollArea.SizeAdjustPolicy.AdjustToContents
         )
@@ -81,7 +87,11 @@ class CustomXRayDialog(QDialog):
 
         search_line = QLineEdit()
         search_line.setPlaceholderText(_("Search"))
-        search_line.textChanged.connect(lambda: self.search_x_ray(search_line.text()))
+        search_timer = QTimer(self)
+        search_timer.setSingleShot(True)
+        search_timer.setInterval(150)
+        search_timer.timeout.connect(lambda: self.search_x_ray(search_line.text()))
+        search_line.textChanged.connect(lambda: search_timer.start())
         vl.addWidget(search_line)
 
         edit_buttons = QHBoxLayout()
@@ -102,14 +112,17 @@ class CustomXRayDialog(QDialog):
         vl.addWidget(save_button_box)
 
     def search_x_ray(self, text: str) -> None:
-        if matches := self.x_ray_model.match(
-            self.x_ray_model.index(0, 0), Qt.ItemDataRole.DisplayRole, text
-        ):
-            self.x_ray_table.setCurrentIndex(matches[0])
-            self.x_ray_table.scrollTo(matches[0])
+        if (row := self.x_ray_model.find_row(text)) is not None:
+            while row >= self.x_ray_model.fetched_rows:
+                self.x_ray_model.fetchMore(QModelIndex())
+            index = self.x_ray_model.index(row, 0)
+            self.x_ray_table.setCurrentIndex(index)
+            self.x_ray_table.scrollTo(index)
 
     def add_x_ray(self) -> None:
-        add_x_dlg = AddXRayDialog(self)
+        add_x_dlg = AddXRayDialog(
+            self, self.ner_delegate.item_model, self.source_delegate.item_model
+        )
         if add_x_dlg.exec() and (name := add_x_dlg.name_line.text()):
             self.x_ray_model.insert_data(
                 [
@@ -125,7 +138,6 @@ class CustomXRayDialog(QDialog):
 
     def delete_x_ray(self) -> None:
         self.x_ray_model.delete_data(self.x_ray_table.selectedIndexes())
-        self.x_ray_table.resizeColumnsToContents()
 
 
 class XRayTableModel(QAbstractTableModel):
@@ -137,6 +149,9 @@ class XRayTableModel(QAbstractTableModel):
                 self.x_ray_data = json.load(f)
         else:
             self.x_ray_data = []
+        self.fetched_rows = min(len(self.x_ray_data), FETCH_ROW_COUNT)
+        # sorted (casefolded name, row) pairs, rebuilt after names change
+        self.name_index: list[tuple[str, int]] | None = None
         self.headers = [
             _("Name"),
             _("Named entity label"),
@@ -147,24 +162,46 @@ class XRayTableModel(QAbstractTableModel):
         ]
 
     def data(self, index, role=Qt.ItemDataRole.DisplayRole):
-        if not index.isValid():
+        if role not in DATA_ROLES or not index.isValid():
             return QVariant()
-        row = index.row()
         column = index.column()
-        value = self.x_ray_data[row][column]
+        value = self.x_ray_data[index.row()][column]
         if role == Qt.ItemDataRole.DisplayRole or role == Qt.ItemDataRole.EditRole:
             return value
         elif role == Qt.ItemDataRole.ToolTipRole and column == 3:
             return value
         elif role == Qt.ItemDataRole.CheckStateRole and column == 5:
-            new_value = Qt.CheckState.Checked if value else Qt.CheckState.Unchecked
-            if isinstance(new_value, int):  # PyQt5
-                return new_value
-            else:  # PyQt6 Enum
-                return new_value.value
+            return CHECKED_VALUE if value else UNCHECKED_VALUE
 
     def rowCount(self, index):
-        return len(self.x_ray_data)
+        return self.fetched_rows
+
+    def canFetchMore(self, index):
+        return self.fetched_rows < len(self.x_ray_data)
+
+    def fetchMore(self, index):
+        count = min(len(self.x_ray_data) - self.fetched_rows, FETCH_ROW_COUNT)
+        if count <= 0:
+            return
+        self.beginInsertRows(
+            QModelIndex(), self.fetched_rows, self.fetched_rows + count - 1
+        )
+        self.fetched_rows += count
+        self.endInsertRows()
+
+    def find_row(self, text: str) -> int | None:
+        if self.name_index is None:
+            self.name_index = sorted(
+                (name.casefold(), row) for row, (name, *_) in enumerate(self.x_ray_data)
+            )
+        text = text.casefold()
+        start = bisect_left(self.name_index, (text,))
+        end = bisect_left(self.name_index, (text + "\U0010ffff",), start)
+        return min((row for _, row in self.name_index[start:end]), default=None)
+
+    def fetch_all(self):
+        while self.canFetchMore(QModelIndex()):
+            self.fetchMore(QModelIndex())
 
     def columnCount(self, index):
         return len(self.headers)
@@ -193,40 +230,50 @@ class XRayTableModel(QAbstractTableModel):
         column = index.column()
         if role == Qt.ItemDataRole.EditRole:
             self.x_ray_data[row][column] = value
+            if column == 0:
+                self.name_index = None
             self.dataChanged.emit(index, index, [role])
             return True
         elif role == Qt.ItemDataRole.CheckStateRole and column == 5:
-            checked_value = (
-                Qt.CheckState.Checked
-                if isinstance(Qt.CheckState.Checked, int)
-                else Qt.CheckState.Checked.value
-            )
-            self.x_ray_data[row][column] = value == checked_value
+            self.x_ray_data[row][column] = value == CHECKED_VALUE
             self.dataChanged.emit(index, index, [role])
             return True
         return False
 
     def insert_data(self, data):
+        self.fetch_all()
         index = QModelIndex()
         self.beginInsertRows(index, self.rowCount(index), self.rowCount(index))
         self.x_ray_data.append(data)
+        self.fetched_rows += 1
+        self.name_index = None
         self.endInsertRows()
 
     def delete_data(self, indexes):
-        for row in sorted(
-            [index.row() for index in indexes if index.row() >= 0], reverse=True
-        ):
-            self.beginRemoveRows(QModelIndex(), row, row)
-            self.x_ray_data.pop(row)
+        # group selected rows into contiguous ranges and remove each range at once
+        ranges: list[list[int]] = []
+        for row in sorted({index.row() for index in indexes if index.row() >= 0}):
+            if ranges and ranges[-1][1] == row - 1:
+                ranges[-1][1] = row
+            else:
+                ranges.append([row, row])
+        for first, last in reversed(ranges):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.x_ray_data[first : last + 1]
+            self.fetched_rows -= last - first + 1
             self.endRemoveRows()
+        self.name_index = None
 
     def save_data(self) -> None:
-        with open(self.custom_path, "w", encoding="utf-8") as f:
+        # write to a temporary file then replace, a failed save keeps the old file
+        tmp_path = self.custom_path.with_name(self.custom_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
             json.dump(self.x_ray_data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.custom_path)
 
 
 class AddXRayDialog(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, parent, ner_model, source_model):
         super().__init__(parent)
         self.setWindowTitle(_("Add new X-Ray data"))
         vl = QVBoxLayout()
@@ -240,11 +287,7 @@ class AddXRayDialog(QDialog):
         form_layout.addRow(_("Name"), self.name_line)
 
         self.ner_label = QComboBox()
-        for index, (label, exp) in zip(
-            range(len(NER_LABEL_EXPLANATIONS)), NER_LABEL_EXPLANATIONS.items()
-        ):
-            self.ner_label.addItem(label, label)
-            self.ner_label.setItemData(index, exp, Qt.ItemDataRole.ToolTipRole)
+        self.ner_label.setModel(ner_model)
         form_layout.addRow(_("NER label"), self.ner_label)
 
         self.aliases = QLineEdit()
@@ -261,8 +304,7 @@ class AddXRayDialog(QDialog):
         )
 
         self.source = QComboBox()
-        for value, text in DESC_SOURCES.items():
-            self.source.addItem(text, value)
+        self.source.setModel(source_model)
         form_layout.addRow(_("Description source"), self.source)
 
         self.omit = QCheckBox()
@@ -1,6 +1,6 @@
 import sqlite3
 from pathlib import Path
-from typing import Iterator
+from typing import Iterable, Iterator
 
 try:
     from .utils import load_plugin_json
@@ -59,6 +59,20 @@ def insert_lemma(ll_conn: sqlite3.Connection, data: tuple[int, int, int, int]) -
     )
 
 
+def create_lemmas_indices(conn: sqlite3.Connection) -> None:
+    # the customize lemmas table is sorted by lemma, these two indices let
+    # SQLite walk lemmas in order instead of sorting the joined rows
+    try:
+        with conn:
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_lemmas_lemma ON lemmas(lemma)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_senses_lemma_id ON senses(lemma_id)"
+            )
+    except sqlite3.OperationalError:
+        # locked or read-only database, try again next time
+        pass
+
+
 def get_x_ray_path(asin: str, book_path: str) -> Path:
     return Path(book_path).parent.joinpath(f"XRAY.entities.{asin}.asc")
 
@@ -76,6 +90,7 @@ def create_x_ray_db(
     x_ray_conn.executescript(
         """
     PRAGMA user_version = 1;
+    PRAGMA temp_store = MEMORY;
 
     CREATE TABLE book_metadata (
     srl INTEGER,
@@ -168,13 +183,10 @@ def create_x_ray_db(
 
 
 def create_x_indices(conn: sqlite3.Connection) -> None:
-    conn.executescript(
-        """
-        CREATE INDEX idx_entity_type ON entity(type ASC);
-        CREATE INDEX idx_entity_excerpt ON entity_excerpt(entity ASC);
-        CREATE INDEX idx_occurrence_start ON occurrence(start ASC);
-        """
-    )
+    # executescript() would commit the pending inserts first
+    conn.execute("CREATE INDEX idx_entity_type ON entity(type ASC)")
+    conn.execute("CREATE INDEX idx_entity_excerpt ON entity_excerpt(entity ASC)")
+    conn.execute("CREATE INDEX idx_occurrence_start ON occurrence(start ASC)")
 
 
 def insert_x_book_metadata(
@@ -204,10 +216,10 @@ def insert_x_entities(
     )
 
 
-def insert_x_entity_description(
-    conn: sqlite3.Connection, data: tuple[str, str, int | None, int]
+def insert_x_entity_descriptions(
+    conn: sqlite3.Connection, data: Iterable[tuple[str, str, int | None, int]]
 ) -> None:
-    conn.execute("INSERT INTO entity_description VALUES(?, ?, ?, ?)", data)
+    conn.executemany("INSERT INTO entity_description VALUES(?, ?, ?, ?)", data)
 
 
 def insert_x_occurrences(
@@ -217,13 +229,13 @@ def insert_x_occurrences(
 
 
 def get_top_ten_entities(conn: sqlite3.Connection, entity_type: int) -> str:
-    entity_ids = []
-    for (entity_id,) in conn.execute(
-        "SELECT id FROM entity WHERE type = ? ORDER BY count DESC LIMIT 10",
-        (entity_type,),
-    ):
-        entity_ids.append(entity_id)
-    return ",".join(map(str, entity_ids))
+    return ",".join(
+        str(entity_id)
+        for (entity_id,) in conn.execute(
+            "SELECT id FROM entity WHERE type = ? ORDER BY count DESC LIMIT 10",
+            (entity_type,),
+        )
+    )
 
 
 def insert_x_types(conn: sqlite3.Connection) -> None:
@@ -237,10 +249,10 @@ def insert_x_type(
     conn.execute("INSERT INTO type VALUES(?, ?, ?, ?, ?)", data)
 
 
-def insert_x_excerpt_image(
-    conn: sqlite3.Connection, data: tuple[int, int, int, str, int]
+def insert_x_excerpt_images(
+    conn: sqlite3.Connection, data: Iterable[tuple[int, int, int, str, int]]
 ) -> None:
-    conn.execute(
+    conn.executemany(
         "INSERT INTO excerpt (id, start, length, image, goto) VALUES(?, ?, ?, ?, ?)",
         data,
     )
@@ -266,8 +278,8 @@ def compare_klld_metadata(
 
 
 def is_same_klld(path_a: Path, path_b: Path) -> bool:
-    conn_a = sqlite3.connect(path_a)
-    conn_b = sqlite3.connect(path_b)
+    conn_a = sqlite3.connect(path_a.resolve().as_uri() + "?mode=ro", uri=True)
+    conn_b = sqlite3.connect(path_b.resolve().as_uri() + "?mode=ro", uri=True)
     for key in ["lemmaLanguage", "definitionLanguage", "version"]:
         if not compare_klld_metadata(conn_a, conn_b, key):
             conn_a.close()
@@ -1,12 +1,16 @@
 import bz2
+import fnmatch
 import platform
 import shutil
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any
 from urllib.request import urlopen
 
 from calibre.constants import isfrozen, ismacos, iswindows
 
+from .database import create_lemmas_indices
 from .utils import (
     PROFICIENCY_RELEASE_URL,
     Prefs,
@@ -35,14 +39,17 @@ def install_deps(pkg: str, notif: Any) -> None:
                 shutil.rmtree(old_libs_path)
 
     dep_versions = load_plugin_json(plugin_path, "data/deps.json")
+    # list the folder once per call instead of globbing for every package,
+    # the user could have deleted it since the last call
+    libs_names = list_libs()
     if pkg == "lxml":
-        pip_install("lxml", dep_versions["lxml"], notif=notif)
+        pip_install("lxml", dep_versions["lxml"], libs_names, notif=notif)
     else:
         # Install X-Ray dependencies
-        pip_install("rapidfuzz", dep_versions["rapidfuzz"], notif=notif)
+        pip_install("rapidfuzz", dep_versions["rapidfuzz"], libs_names, notif=notif)
 
         if pkg == "":
-            pip_install("spacy", dep_versions["spacy"], notif=notif)
+            pip_install("spacy", dep_versions["spacy"], libs_names, notif=notif)
         else:
             model_version = dep_versions[
                 "spacy_trf_model" if pkg.endswith("_trf") else "spacy_cpu_model"
@@ -51,17 +58,18 @@ def install_deps(pkg: str, notif: Any) -> None:
                 "https://github.com/explosion/spacy-models/releases/download/"
                 f"{pkg}-{model_version}/{pkg}-{model_version}-py3-none-any.whl"
             )
-            pip_install(pkg, model_version, url=url, notif=notif)
+            pip_install(pkg, model_version, libs_names, url=url, notif=notif)
             if pkg.endswith("_trf"):
                 from .config import prefs
 
-                pip_install("cupy-wheel", dep_versions["cupy"], notif=notif)
+                pip_install("cupy-wheel", dep_versions["cupy"], libs_names, notif=notif)
                 # PyTorch's Windows package on pypi.org is CPU build version,
                 # reintall the CUDA build version
                 if iswindows or prefs["cuda"] == "cu118":
                     pip_install(
                         "torch",
                         dep_versions["torch"],
+                        libs_names,
                         extra_index=f"https://download.pytorch.org/whl/{prefs['cuda']}",
                         notif=notif,
                     )
@@ -70,6 +78,7 @@ def install_deps(pkg: str, notif: Any) -> None:
                     pip_install(
                         "typing-extensions",
                         dep_versions["typing-extensions"],
+                        libs_names,
                         notif=notif,
                     )
 
@@ -77,6 +86,7 @@ def install_deps(pkg: str, notif: Any) -> None:
             pip_install(
                 "thinc-apple-ops",
                 dep_versions["thinc-apple-ops"],
+                libs_names,
                 no_deps=True,
                 notif=notif,
             )
@@ -117,9 +127,14 @@ def which_python() -> tuple[str, str]:
     return py, py_v
 
 
+def list_libs() -> list[str]:
+    return [path.name for path in LIBS_PATH.iterdir()] if LIBS_PATH.is_dir() else []
+
+
 def pip_install(
     pkg: str,
     pkg_version: str,
+    libs_names: list[str],
     url: str | None = None,
     extra_index: str | None = None,
     no_deps: bool = False,
@@ -128,7 +143,7 @@ def pip_install(
     pattern = f"{pkg.replace('-', '_')}-{pkg_version}*"
     if pkg == "torch" and extra_index:
         pattern = f"torch-{pkg_version}+{extra_index.split('/')[-1]}*"
-    if not any(LIBS_PATH.glob(pattern)):
+    if not fnmatch.filter(libs_names, pattern):
         if notif:
             notif.put((0, f"Installing {pkg}"))
 
@@ -159,6 +174,8 @@ def pip_install(
             args.extend(["--extra-index-url", extra_index])
 
         run_subprocess(args)
+        # pip could also install the packages checked next
+        libs_names[:] = list_libs()
 
 
 def download_word_wise_file(
@@ -184,18 +201,33 @@ def download_word_wise_file(
     else:
         db_path = wiktionary_db_path(plugin_path, lemma_lang, gloss_lang)
 
-    if not db_path.exists():
-        bz2_filename = db_path.with_suffix(db_path.suffix + ".bz2").name
-        download_and_extract(f"{PROFICIENCY_RELEASE_URL}/{bz2_filename}", db_path)
-
+    paths = [db_path]
     if is_kindle:
-        klld_path = get_wiktionary_klld_path(plugin_path, lemma_lang, gloss_lang)
-        if not klld_path.exists():
-            bz2_filename = klld_path.with_suffix(klld_path.suffix + ".bz2").name
-            download_and_extract(f"{PROFICIENCY_RELEASE_URL}/{bz2_filename}", klld_path)
+        paths.append(get_wiktionary_klld_path(plugin_path, lemma_lang, gloss_lang))
+    paths = [path for path in paths if not path.exists()]
+    # download the database and klld files at the same time
+    with ThreadPoolExecutor() as executor:
+        futures = [
+            executor.submit(
+                download_and_extract,
+                f"{PROFICIENCY_RELEASE_URL}/{path.name}.bz2",
+                path,
+            )
+            for path in paths
+        ]
+        for future in futures:
+            future.result()
+    # also index databases downloaded by older versions
+    if db_path.exists():
+        conn = sqlite3.connect(db_path)
+        create_lemmas_indices(conn)
+        conn.close()
 
 
 def download_and_extract(url: str, extract_path: Path) -> None:
     extract_path.parent.mkdir(parents=True, exist_ok=True)
-    with urlopen(url) as r, bz2.open(r) as bz2_f, extract_path.open("wb") as f:
-        shutil.copyfileobj(bz2_f, f)
+    # an interrupted download shouldn't leave a file that looks complete
+    tmp_path = extract_path.with_name(extract_path.name + ".tmp")
+    with urlopen(url) as r, bz2.open(r) as bz2_f, tmp_path.open("wb") as f:
+        shutil.copyfileobj(bz2_f, f, 1024 * 1024)
+    tmp_path.replace(extract_path)
@@ -1,14 +1,17 @@
 import operator
+import os
 import re
 import shutil
 import sqlite3
+import tempfile
 import zipfile
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from functools import partial
+from functools import cache
 from html import escape, unescape
 from pathlib import Path
-from typing import Iterator
+from typing import Any, Iterator
 from urllib.parse import unquote
 
 try:
@@ -26,6 +29,7 @@ try:
         CustomXDict,
         XRayEntity,
         is_full_name,
+        rapidfuzz_functions,
     )
 except ImportError:
     from mediawiki import (
@@ -42,6 +46,7 @@ except ImportError:
         CustomXDict,
         XRayEntity,
         is_full_name,
+        rapidfuzz_functions,
     )
 
 
@@ -52,8 +57,44 @@ NAMESPACES = {
     "xml": "http://www.w3.org/1999/xhtml",
 }
 
+# soft hyphen, byte order mark, word joiner
+INVISIBLE_CHARS = str.maketrans("", "", "\xad\ufeff\u2060")
+INVISIBLE_ENTITIES_RE = re.compile(r"&shy;|&#xad;|&#173;|&NoBreak;", re.I)
+# text between two tags
+TEXT_NODE_RE = re.compile(r">[^<]{2,}<")
 
-@dataclass
+X_RAY_ANCHOR_START = '<a class="x-ray" epub:type="noteref" href="x_ray.xhtml#'
+WORD_WISE_ANCHOR_START = (
+    '<a class="wordwise" epub:type="noteref" href="word_wise.xhtml#'
+)
+WORD_WISE_RUBY_START = (
+    '<ruby class="wordwise"><a epub:type="noteref" href="word_wise.xhtml#'
+)
+
+IMAGE_MEDIA_TYPES = {".svg": "svg+xml", ".png": "png", ".jpg": "jpeg", ".webp": "webp"}
+
+LEMMA_SENSES_SQL = """
+SELECT DISTINCT s.id
+FROM senses s JOIN lemmas l ON s.lemma_id = l.id
+WHERE lemma = ?
+"""
+LEMMA_POS_SENSES_SQL = LEMMA_SENSES_SQL + " AND pos = ?"
+FORM_SENSES_SQL = """
+SELECT DISTINCT s.id
+FROM senses s JOIN forms f ON s.lemma_id = f.lemma_id AND s.pos = f.pos
+WHERE form = ?
+"""
+FORM_POS_SENSES_SQL = FORM_SENSES_SQL + " AND f.pos = ?"
+
+
+@cache
+def compiled_xpath(path: str) -> Any:
+    from lxml import etree
+
+    return etree.XPath(path, namespaces=NAMESPACES)
+
+
+@dataclass(slots=True)
 class Occurrence:
     paragraph_start: int
     paragraph_end: int
@@ -63,7 +104,7 @@ class Occurrence:
     sense_ids: tuple[int, ...] = ()
 
 
-@dataclass
+@dataclass(slots=True)
 class Sense:
     pos: str
     short_def: str
@@ -88,11 +129,19 @@ class EPUB:
         self.wikidata = wikidata
         self.entity_id = 0
         self.entities: dict[str, XRayEntity] = {}
+        # entity name -> name processed for fuzzy matching
+        self.processed_names: dict[str, str] = {}
         self.entity_occurrences: dict[Path, list[Occurrence]] = defaultdict(list)
+        # XHTML texts without invisible characters, written back after modified
+        self.xhtml_texts: dict[Path, str] = {}
+        self.stripped_xhtml_paths: set[Path] = set()
         self.removed_entity_ids: set[int] = set()
-        self.extract_folder = self.book_path.with_name("extract")
-        if self.extract_folder.exists():
-            shutil.rmtree(self.extract_folder)
+        # new folder next to the book, no leftover folder to remove first
+        self.extract_folder = Path(
+            tempfile.mkdtemp(prefix="extract_", dir=self.book_path.parent)
+        )
+        # relative path and its trailing parts -> extracted file
+        self.extracted_files: dict[str, Path] | None = None
         self.xhtml_folder = self.extract_folder
         self.xhtml_href_has_folder = False
         self.image_folder = self.extract_folder
@@ -100,12 +149,16 @@ class EPUB:
         self.image_filenames: set[str] = set()
         self.custom_x_ray = custom_x_ray
         self.sense_id_dict: dict[tuple[int, ...], int] = {}
+        self.short_defs: dict[int, str] = {}  # sense id -> short gloss
         self.word_wise_id = 0
         self.lemmas_conn: sqlite3.Connection | None = lemmas_conn
         self.prefs: Prefs = {}
         self.lemma_lang: str = ""
         self.gloss_lang: str = ""
         self.gloss_source: str = ""
+        self.ipa_columns = "ipa"
+        # link to the footnote instead of ruby if gloss is this many times longer
+        self.ruby_len_ratio = 2.5
 
     def extract_epub(self) -> Iterator[tuple[str, tuple[int, int, Path]]]:
         from lxml import etree
@@ -114,61 +167,60 @@ class EPUB:
             zf.extractall(self.extract_folder)
 
         opf_root = etree.parse(self.extract_folder / "META-INF/container.xml")
-        opf_path = unquote(opf_root.find(".//n:rootfile", NAMESPACES).get("full-path"))
-        self.opf_path = self.extract_folder.joinpath(opf_path)
-        if not self.opf_path.exists():
-            self.opf_path = next(self.extract_folder.rglob(opf_path))
+        opf_path = unquote(
+            compiled_xpath(".//n:rootfile")(opf_root)[0].get("full-path")
+        )
+        self.opf_path = self.find_extracted_file(opf_path)
         self.opf_root = etree.parse(self.opf_path)
 
         # find image files folder
-        for item in self.opf_root.xpath(
-            'opf:manifest/opf:item[starts-with(@media-type, "image/")]',
-            namespaces=NAMESPACES,
-        ):
+        for item in compiled_xpath(
+            'opf:manifest/opf:item[starts-with(@media-type, "image/")]'
+        )(self.opf_root):
             image_href = unquote(item.get("href"))
-            image_path = self.extract_folder.joinpath(image_href)
-            if not image_path.exists():
-                image_path = next(self.extract_folder.rglob(image_href))
-            if not image_path.parent.samefile(self.extract_folder):
+            image_path = self.find_extracted_file(image_href)
+            if image_path.parent != self.extract_folder:
                 self.image_folder = image_path.parent
             if "/" in image_href:
                 self.image_href_has_folder = True
                 break
 
-        for itemref in self.opf_root.iterfind("opf:spine/opf:itemref", NAMESPACES):
-            idref = itemref.get("idref")
-            item = self.opf_root.find(
-                f'opf:manifest/opf:item[@id="{idref}"]', NAMESPACES
-            )
+        xhtml_paths = []
+        find_item = compiled_xpath("opf:manifest/opf:item[@id=$idref]")
+        for itemref in compiled_xpath("opf:spine/opf:itemref")(self.opf_root):
+            item = find_item(self.opf_root, idref=itemref.get("idref"))[0]
             xhtml_href = unquote(item.get("href"))
-            xhtml_path = self.extract_folder.joinpath(xhtml_href)
-            if not xhtml_path.exists():
-                xhtml_path = next(self.extract_folder.rglob(xhtml_href))
-            if not xhtml_path.parent.samefile(self.extract_folder):
+            xhtml_path = self.find_extracted_file(xhtml_href)
+            if xhtml_path.parent != self.extract_folder:
                 self.xhtml_folder = xhtml_path.parent
             if "/" in xhtml_href:
                 self.xhtml_href_has_folder = True
-            with xhtml_path.open("r", encoding="utf-8") as f:
-                # remove soft hyphen, byte order mark, word joiner
-                xhtml_text = re.sub(
-                    r"\xad|&shy;|&#xad;|&#173;|\ufeff|\u2060|&NoBreak;",
-                    "",
-                    f.read(),
-                    flags=re.I,
-                )
-            with xhtml_path.open("w", encoding="utf-8") as f:
-                f.write(xhtml_text)
-            for match_body in re.finditer(r"<body.{3,}?</body>", xhtml_text, re.DOTALL):
-                for m in re.finditer(r">[^<]{2,}<", match_body.group(0)):
-                    text = m.group(0)[1:-1]
-                    yield (
-                        unescape(text),
-                        (
-                            match_body.start() + m.start() + 1,
-                            match_body.start() + m.end() - 1,
-                            xhtml_path,
-                        ),
-                    )
+            xhtml_paths.append(xhtml_path)
+
+        # read files in background threads while the caller parses texts
+        with ThreadPoolExecutor() as executor:
+            for xhtml_path, (xhtml_text, stripped) in zip(
+                xhtml_paths, executor.map(read_xhtml, xhtml_paths)
+            ):
+                self.xhtml_texts[xhtml_path] = xhtml_text
+                if stripped:
+                    self.stripped_xhtml_paths.add(xhtml_path)
+                yield from find_text_nodes(xhtml_text, xhtml_path)
+
+    def find_extracted_file(self, href: str) -> Path:
+        # normalized path could be compared to the extract folder without stat
+        path = Path(os.path.normpath(self.extract_folder.joinpath(href)))
+        if path.exists():
+            return path
+        if self.extracted_files is None:
+            # walk the extract folder once instead of calling rglob for each href
+            self.extracted_files = {}
+            for path in self.extract_folder.rglob("*"):
+                if path.is_file():
+                    parts = path.relative_to(self.extract_folder).parts
+                    for index in range(len(parts)):
+                        self.extracted_files.setdefault("/".join(parts[index:]), path)
+        return self.extracted_files[href]
 
     def add_entity(
         self,
@@ -181,33 +233,34 @@ class EPUB:
         word_end: int,
         xhtml_path: Path,
     ) -> None:
-        from rapidfuzz.fuzz import token_set_ratio
-        from rapidfuzz.process import extractOne
-        from rapidfuzz.utils import default_process
-
+        extract_one, token_set_ratio, default_process = rapidfuzz_functions()
         if entity_data := self.entities.get(entity_name):
             entity_id = entity_data.id
             entity_data.count += 1
         elif entity_name not in self.custom_x_ray and (
-            r := extractOne(
-                entity_name,
-                self.entities.keys(),
+            r := extract_one(
+                default_process(entity_name),
+                self.processed_names,
                 score_cutoff=FUZZ_THRESHOLD,
-                scorer=partial(token_set_ratio, processor=default_process),
+                scorer=token_set_ratio,
+                processor=None,
             )
         ):
-            matched_name = r[0]
+            matched_name = r[2]
             matched_entity = self.entities[matched_name]
             matched_entity.count += 1
             entity_id = matched_entity.id
             if is_full_name(matched_name, matched_entity.label, entity_name, ner_label):
                 self.entities[entity_name] = matched_entity
                 del self.entities[matched_name]
+                self.processed_names[entity_name] = default_process(entity_name)
+                del self.processed_names[matched_name]
         else:
             entity_id = self.entity_id
             self.entities[entity_name] = XRayEntity(
                 self.entity_id, book_quote, ner_label, 1
             )
+            self.processed_names[entity_name] = default_process(entity_name)
             self.entity_id += 1
 
         self.entity_occurrences[xhtml_path].append(
@@ -251,15 +304,20 @@ class EPUB:
         )
 
     def remove_entities(self, minimal_count: int) -> None:
-        for entity_name, entity_data in self.entities.copy().items():
+        if self.mediawiki is None:  # mypy
+            return
+        get_cache = self.mediawiki.get_cache
+        kept_entities: dict[str, XRayEntity] = {}
+        for entity_name, entity_data in self.entities.items():
             if (
                 entity_data.count < minimal_count
-                and self.mediawiki is not None  # mypy
-                and self.mediawiki.get_cache(entity_name) is None
+                and get_cache(entity_name) is None
                 and entity_name not in self.custom_x_ray
             ):
-                del self.entities[entity_name]
                 self.removed_entity_ids.add(entity_data.id)
+            else:
+                kept_entities[entity_name] = entity_data
+        self.entities = kept_entities
 
     def modify_epub(
         self, prefs: Prefs, lemma_lang: str, gloss_lang: str, gloss_source: str
@@ -268,6 +326,13 @@ class EPUB:
         self.lemma_lang = lemma_lang
         self.gloss_lang = gloss_lang
         self.gloss_source = gloss_source
+        if lemma_lang in CJK_LANGS:
+            self.ruby_len_ratio = 3
+        if gloss_source == "kaikki":
+            if lemma_lang == "en":
+                self.ipa_columns = "ga_ipa, rp_ipa"
+            elif lemma_lang == "zh":
+                self.ipa_columns = "pinyin, bopomofo"
         if len(self.entities) > 0 and self.mediawiki is not None:
             self.mediawiki.query(self.entities, prefs["search_people"])
             if self.wikidata is not None:
@@ -275,9 +340,16 @@ class EPUB:
             if prefs["minimal_x_ray_count"] > 1:
                 self.remove_entities(prefs["minimal_x_ray_count"])
             self.create_x_ray_footnotes()
+        if len(self.sense_id_dict) > 0 and self.lemmas_conn is not None:
+            # read all glosses in one transaction
+            self.lemmas_conn.execute("PRAGMA cache_size = -65536")
+            self.lemmas_conn.execute("PRAGMA mmap_size = 268435456")
+            self.lemmas_conn.execute("BEGIN")
         self.insert_anchor_elements()
         if len(self.sense_id_dict) > 0:
             self.create_word_wise_footnotes()
+        if self.lemmas_conn is not None and self.lemmas_conn.in_transaction:
+            self.lemmas_conn.commit()
         self.modify_opf()
         self.zip_extract_folder()
         if self.mediawiki is not None:
@@ -305,49 +377,51 @@ class EPUB:
             }
             """
 
+        modified_paths: set[Path] = set()
         for xhtml_path, occurrences in self.entity_occurrences.items():
+            if len(self.removed_entity_ids) > 0:
+                occurrences = [
+                    occurrence
+                    for occurrence in occurrences
+                    if occurrence.entity_id not in self.removed_entity_ids
+                ]
+                if len(occurrences) == 0:
+                    continue
             if len(self.entities) > 0 and self.lemmas_conn is not None:
                 occurrences = sorted(
                     occurrences,
                     key=operator.attrgetter("paragraph_start", "word_start"),
                 )
-            with xhtml_path.open(encoding="utf-8") as f:
-                xhtml_str = f.read()
-            new_xhtml_str = ""
+            modified_paths.add(xhtml_path)
+            xhtml_str = self.xhtml_texts[xhtml_path]
+            parts: list[str] = []
             last_p_text = ""
             last_w_end = 0
             last_p_end = 0
             for occurrence in occurrences:
-                if occurrence.entity_id in self.removed_entity_ids:
-                    continue
                 if occurrence.paragraph_end != last_p_end:
-                    new_xhtml_str += escape(last_p_text[last_w_end:])
-                    new_xhtml_str += xhtml_str[last_p_end : occurrence.paragraph_start]
+                    parts.append(escape(last_p_text[last_w_end:]))
+                    parts.append(xhtml_str[last_p_end : occurrence.paragraph_start])
                     last_w_end = 0
+                    last_p_end = occurrence.paragraph_end
+                    # unescape each paragraph once for all its occurrences
+                    last_p_text = unescape(
+                        xhtml_str[occurrence.paragraph_start : occurrence.paragraph_end]
+                    )
 
-                paragraph_text = unescape(
-                    xhtml_str[occurrence.paragraph_start : occurrence.paragraph_end]
-                )
-                new_xhtml_str += escape(
-                    paragraph_text[last_w_end : occurrence.word_start]
-                )
-                word = paragraph_text[occurrence.word_start : occurrence.word_end]
+                parts.append(escape(last_p_text[last_w_end : occurrence.word_start]))
+                word = last_p_text[occurrence.word_start : occurrence.word_end]
                 if occurrence.entity_id != -1:
-                    new_xhtml_str += (
-                        f'<a class="x-ray" epub:type="noteref" href="x_ray.xhtml#'
-                        f'{occurrence.entity_id}">{escape(word)}</a>'
+                    parts.append(
+                        f'{X_RAY_ANCHOR_START}{occurrence.entity_id}">{escape(word)}</a>'
                     )
                 else:
-                    new_xhtml_str += self.build_word_wise_tag(
-                        occurrence.sense_ids, word
-                    )
+                    parts.append(self.build_word_wise_tag(occurrence.sense_ids, word))
                 last_w_end = occurrence.word_end
-                if occurrence.paragraph_end != last_p_end:
-                    last_p_end = occurrence.paragraph_end
-                    last_p_text = paragraph_text
 
-            new_xhtml_str += escape(last_p_text[last_w_end:])
-            new_xhtml_str += xhtml_str[last_p_end:]
+            parts.append(escape(last_p_text[last_w_end:]))
+            parts.append(xhtml_str[last_p_end:])
+            new_xhtml_str = "".join(parts)
 
             # add epub namespace and CSS
             with xhtml_path.open("w", encoding="utf-8") as f:
@@ -362,25 +436,26 @@ class EPUB:
                     )
                 f.write(new_xhtml_str)
 
+        for xhtml_path in self.stripped_xhtml_paths - modified_paths:
+            with xhtml_path.open("w", encoding="utf-8") as f:
+                f.write(self.xhtml_texts[xhtml_path])
+
     def build_word_wise_tag(
         self,
         sense_ids: tuple[int, ...],
         word: str,
     ) -> str:
         ww_id = self.sense_id_dict[sense_ids]
-        sense_list = self.get_sense_data(sense_ids[:1])
-        short_def = sense_list[0].short_def
-        len_ratio = 3 if self.lemma_lang in CJK_LANGS else 2.5
-        if len(short_def) / len(word) > len_ratio:
-            return (
-                '<a class="wordwise" epub:type="noteref" href="word_wise.xhtml#'
-                f'{ww_id}">{escape(word)}</a>'
-            )
+        short_def = self.short_defs.get(sense_ids[0])
+        if short_def is None:
+            short_def = self.get_sense_data(sense_ids[:1])[0].short_def
+            self.short_defs[sense_ids[0]] = short_def
+        if len(short_def) / len(word) > self.ruby_len_ratio:
+            return f'{WORD_WISE_ANCHOR_START}{ww_id}">{escape(word)}</a>'
         else:
             return (
-                '<ruby class="wordwise"><a epub:type="noteref" href="word_wise.xhtml#'
-                f'{ww_id}">{escape(word)}</a><rp>(</rp><rt>{escape(short_def)}'
-                "</rt><rp>)</rp></ruby>"
+                f'{WORD_WISE_RUBY_START}{ww_id}">{escape(word)}</a><rp>(</rp>'
+                f"<rt>{escape(short_def)}</rt><rp>)</rp></ruby>"
             )
 
     def create_x_ray_footnotes(self) -> None:
@@ -391,36 +466,38 @@ class EPUB:
             image_prefix += "../"
         if self.image_href_has_folder:
             image_prefix += f"{self.image_folder.name}/"
-        s = f"""
+        s = [
+            f"""
         <html xmlns="http://www.w3.org/1999/xhtml"
         xmlns:epub="http://www.idpf.org/2007/ops"
         lang="{self.lemma_lang}" xml:lang="{self.lemma_lang}">
         <head><title>X-Ray</title><meta charset="utf-8"/></head>
         <body>
         """
+        ]
         for entity_name, entity_data in self.entities.items():
             if entity_data.id in self.removed_entity_ids:
                 continue
             elif custom_data := self.custom_x_ray.get(entity_name):
-                s += (
+                s.append(
                     f'<aside id="{entity_data.id}" epub:type="footnote">'
                     f"{create_p_tags(custom_data.desc)}"
                 )
                 if custom_data.source_id is not None:
-                    s += "<p>Source: "
-                    s += (
+                    s.append("<p>Source: ")
+                    s.append(
                         "Wikipedia"
                         if custom_data.source_id == 1
                         else self.mediawiki.sitename
                     )
-                    s += "</p>"
-                s += "</aside>"
+                    s.append("</p>")
+                s.append("</aside>")
             elif (
                 self.prefs["search_people"] or entity_data.label not in PERSON_LABELS
             ) and (intro_cache := self.mediawiki.get_cache(entity_name)):
-                s += f'<aside id="{entity_data.id}" epub:type="footnote">'
-                s += create_p_tags(intro_cache.intro)
-                s += f"<p>Source: {self.mediawiki.sitename}</p>"
+                s.append(f'<aside id="{entity_data.id}" epub:type="footnote">')
+                s.append(create_p_tags(intro_cache.intro))
+                s.append(f"<p>Source: {self.mediawiki.sitename}</p>")
                 if self.wikidata is not None and (
                     wikidata_cache := self.wikidata.get_cache(
                         intro_cache.wikidata_item_id
@@ -428,14 +505,14 @@ class EPUB:
                 ):
                     add_wikidata_source = False
                     if inception := wikidata_cache.get("inception"):
-                        s += f"<p>{inception_text(inception)}</p>"
+                        s.append(f"<p>{inception_text(inception)}</p>")
                         add_wikidata_source = True
                     if self.wiki_commons is not None and (
                         filename := wikidata_cache.get("map_filename")
                     ):
                         file_path = self.wiki_commons.get_image(filename)
                         if file_path is not None:
-                            s += (
+                            s.append(
                                 '<img style="max-width:100%" src="'
                                 f'{image_prefix}{filename}" />'
                             )
@@ -443,56 +520,65 @@ class EPUB:
                             self.image_filenames.add(filename)
                             add_wikidata_source = True
                     if add_wikidata_source:
-                        s += "<p>Source: Wikidata</p>"
-                s += "</aside>"
+                        s.append("<p>Source: Wikidata</p>")
+                s.append("</aside>")
             else:
-                s += (
+                s.append(
                     f'<aside id="{entity_data.id}" epub:type="footnote"><p>'
                     f"{escape(entity_data.quote)}</p></aside>"
                 )
 
-        s += "</body></html>"
+        s.append("</body></html>")
         with self.xhtml_folder.joinpath("x_ray.xhtml").open("w", encoding="utf-8") as f:
-            f.write(s)
+            f.write("".join(s))
 
     def create_word_wise_footnotes(self) -> None:
-        page_text = f"""
+        page_text = [
+            f"""
         <html xmlns="http://www.w3.org/1999/xhtml"
         xmlns:epub="http://www.idpf.org/2007/ops"
         lang="{self.gloss_lang}" xml:lang="{self.gloss_lang}">
         <head><title>Word Wise</title><meta charset="utf-8"/></head>
         <body>
         """
+        ]
+        senses = self.get_senses_by_id(
+            {sense_id for sense_ids in self.sense_id_dict for sense_id in sense_ids}
+        )
         for sense_ids, ww_id in self.sense_id_dict.items():
-            page_text += self.create_ww_aside_tag(sense_ids, ww_id)
-        page_text += "</body></html>"
+            sense_list = [
+                senses[sense_id]
+                for sense_id in sorted(
+                    sense_ids, key=lambda sense_id: (senses[sense_id].pos, sense_id)
+                )
+            ]
+            page_text.append(self.create_ww_aside_tag(sense_list, ww_id))
+        page_text.append("</body></html>")
         with self.xhtml_folder.joinpath("word_wise.xhtml").open(
             "w", encoding="utf-8"
         ) as f:
-            f.write(page_text)
+            f.write("".join(page_text))
 
-    def create_ww_aside_tag(self, sense_ids: tuple[int, ...], ww_id: int) -> str:
-        sense_list = self.get_sense_data(sense_ids, True)
-        tag_str = ""
-        tag_str += f'<aside id="{ww_id}" epub:type="footnote">'
+    def create_ww_aside_tag(self, sense_list: list[Sense], ww_id: int) -> str:
+        tags = [f'<aside id="{ww_id}" epub:type="footnote">']
         last_pos = ""
         for sense_data in sense_list:
             if sense_data.pos != last_pos:
                 if last_pos != "":
-                    tag_str += "</ol><hr/>"
-                tag_str += f"<p>{sense_data.pos}</p>"
+                    tags.append("</ol><hr/>")
+                tags.append(f"<p>{sense_data.pos}</p>")
                 if last_pos == "":
                     for ipa in sense_data.ipas:
-                        tag_str += f"<p>{escape(ipa)}</p>"
-                tag_str += f"<ol><li>{escape(sense_data.full_def)}"
+                        tags.append(f"<p>{escape(ipa)}</p>")
+                tags.append(f"<ol><li>{escape(sense_data.full_def)}")
                 last_pos = sense_data.pos
             else:
-                tag_str += f"<li>{escape(sense_data.full_def)}"
+                tags.append(f"<li>{escape(sense_data.full_def)}")
             if sense_data.example != "":
-                tag_str += f" <i>{escape(sense_data.example)}</i>"
-            tag_str += "</li>"
-        tag_str += "</ol><hr/><p>Source: Wiktionary</p></aside>"
-        return tag_str
+                tags.append(f" <i>{escape(sense_data.example)}</i>")
+            tags.append("</li>")
+        tags.append("</ol><hr/><p>Source: Wiktionary</p></aside>")
+        return "".join(tags)
 
     def modify_opf(self) -> None:
         from lxml import etree
@@ -503,48 +589,54 @@ class EPUB:
             xhtml_prefix = f"{self.xhtml_folder.name}/"
         if self.image_href_has_folder:
             image_prefix = f"{self.image_folder.name}/"
-        manifest = self.opf_root.find("opf:manifest", NAMESPACES)
+        item_tag = f"{{{NAMESPACES['opf']}}}item"
+        itemref_tag = f"{{{NAMESPACES['opf']}}}itemref"
+        manifest = compiled_xpath("opf:manifest")(self.opf_root)[0]
         if len(self.entities) > 0:
-            s = (
-                f'<item href="{xhtml_prefix}x_ray.xhtml" '
-                'id="x_ray.xhtml" media-type="application/xhtml+xml"/>'
+            etree.SubElement(
+                manifest,
+                item_tag,
+                href=f"{xhtml_prefix}x_ray.xhtml",
+                id="x_ray.xhtml",
+                attrib={"media-type": "application/xhtml+xml"},
             )
-            manifest.append(etree.fromstring(s))
         if len(self.sense_id_dict) > 0:
-            s = (
-                f'<item href="{xhtml_prefix}word_wise.xhtml" '
-                'id="word_wise.xhtml" media-type="application/xhtml+xml"/>'
+            etree.SubElement(
+                manifest,
+                item_tag,
+                href=f"{xhtml_prefix}word_wise.xhtml",
+                id="word_wise.xhtml",
+                attrib={"media-type": "application/xhtml+xml"},
             )
-            manifest.append(etree.fromstring(s))
         for filename in self.image_filenames:
-            filename_lower = filename.lower()
-            if filename_lower.endswith(".svg"):
-                media_type = "svg+xml"
-            elif filename_lower.endswith(".png"):
-                media_type = "png"
-            elif filename_lower.endswith(".jpg"):
-                media_type = "jpeg"
-            elif filename_lower.endswith(".webp"):
-                media_type = "webp"
-            else:
-                media_type = Path(filename).suffix.replace(".", "")
-            s = (
-                f'<item href="{image_prefix}{filename}" id="{filename}" '
-                f'media-type="image/{media_type}"/>'
+            suffix = Path(filename).suffix
+            media_type = IMAGE_MEDIA_TYPES.get(suffix.lower(), suffix[1:])
+            etree.SubElement(
+                manifest,
+                item_tag,
+                href=f"{image_prefix}{filename}",
+                id=filename,
+                attrib={"media-type": f"image/{media_type}"},
             )
-            manifest.append(etree.fromstring(s))
-        spine = self.opf_root.find("opf:spine", NAMESPACES)
+        spine = compiled_xpath("opf:spine")(self.opf_root)[0]
         if len(self.entities) > 0:
-            spine.append(etree.fromstring('<itemref idref="x_ray.xhtml"/>'))
+            etree.SubElement(spine, itemref_tag, idref="x_ray.xhtml")
         if len(self.sense_id_dict) > 0:
-            spine.append(etree.fromstring('<itemref idref="word_wise.xhtml"/>'))
+            etree.SubElement(spine, itemref_tag, idref="word_wise.xhtml")
         with self.opf_path.open("w", encoding="utf-8") as f:
             f.write(etree.tostring(self.opf_root, encoding=str))
 
     def zip_extract_folder(self) -> None:
-        shutil.make_archive(str(self.extract_folder), "zip", self.extract_folder)
-        self.extract_folder.with_suffix(".zip").replace(self.book_path)
-        shutil.rmtree(self.extract_folder)
+        zip_path = self.extract_folder.with_suffix(".zip")
+        mimetype_path = self.extract_folder / "mimetype"
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            # EPUB requires an uncompressed mimetype file as the first entry
+            if mimetype_path.exists():
+                zf.write(mimetype_path, "mimetype", zipfile.ZIP_STORED)
+            for path in self.extract_folder.rglob("*"):
+                if path.is_file() and path != mimetype_path:
+                    zf.write(path, path.relative_to(self.extract_folder))
+        zip_path.replace(self.book_path)
 
     def find_sense_ids(self, word: str, pos: str) -> tuple[int, ...]:
         if pos != "":
@@ -556,27 +648,16 @@ class EPUB:
         if self.lemmas_conn is None:
             return ()
         sense_ids = []
-        for (sense_id,) in self.lemmas_conn.execute(
-            """
-            SELECT DISTINCT s.id
-            FROM senses s JOIN lemmas l ON s.lemma_id = l.id
-            WHERE lemma = ? AND pos = ?
-            """,
-            (word, pos),
-        ):
+        for (sense_id,) in self.lemmas_conn.execute(LEMMA_POS_SENSES_SQL, (word, pos)):
             sense_ids.append(sense_id)
         if len(sense_ids) > 0:
             return tuple(sense_ids)
 
-        sql = """
-            SELECT DISTINCT s.id
-            FROM senses s JOIN forms f
-            ON s.lemma_id = f.lemma_id AND s.pos = f.pos
-            WHERE form = ?
-            """
-        query_values: tuple[str, ...] = (word,)
-        if " " not in word:  # not limit pos for phrase
-            sql += " AND f.pos = ?"
+        if " " in word:  # not limit pos for phrase
+            sql = FORM_SENSES_SQL
+            query_values: tuple[str, ...] = (word,)
+        else:
+            sql = FORM_POS_SENSES_SQL
             query_values = (word, pos)
         for (sense_id,) in self.lemmas_conn.execute(sql, query_values):
             sense_ids.append(sense_id)
@@ -586,49 +667,54 @@ class EPUB:
         if self.lemmas_conn is None:
             return ()
         sense_ids = []
-        for (sense_id,) in self.lemmas_conn.execute(
-            """
-        SELECT DISTINCT s.id
-        FROM senses s JOIN lemmas l ON s.lemma_id = l.id
-        WHERE lemma = ?
-        """,
-            (word,),
-        ):
+        for (sense_id,) in self.lemmas_conn.execute(LEMMA_SENSES_SQL, (word,)):
             sense_ids.append(sense_id)
         if len(sense_ids) > 0:
             return tuple(sense_ids)
-        for (sense_id,) in self.lemmas_conn.execute(
-            """
-        SELECT DISTINCT s.id
-        FROM senses s JOIN forms f ON s.lemma_id = f.lemma_id AND s.pos = f.pos
-        WHERE form = ?
-        """,
-            (word,),
-        ):
+        for (sense_id,) in self.lemmas_conn.execute(FORM_SENSES_SQL, (word,)):
             sense_ids.append(sense_id)
 
         return tuple(sense_ids)
 
-    def get_sense_data(
-        self, sense_ids: tuple[int, ...], order_by_pos: bool = False
-    ) -> list[Sense]:
+    def get_senses_by_id(self, sense_ids: set[int]) -> dict[int, Sense]:
+        if self.lemmas_conn is None:
+            return {}
+        # select all senses in one query instead of one query per footnote
+        self.lemmas_conn.execute(
+            "CREATE TEMP TABLE wanted_senses (id INTEGER PRIMARY KEY)"
+        )
+        senses: dict[int, Sense] = {}
+        try:
+            self.lemmas_conn.executemany(
+                "INSERT INTO wanted_senses VALUES (?)",
+                ((sense_id,) for sense_id in sense_ids),
+            )
+            for data in self.lemmas_conn.execute(
+                f"""
+                SELECT s.id, pos, short_def, full_def, example, {self.ipa_columns}
+                FROM wanted_senses w JOIN senses s ON s.id = w.id
+                JOIN lemmas l ON s.lemma_id = l.id
+                """
+            ):
+                senses[data[0]] = Sense(
+                    pos=data[1] or "",
+                    short_def=data[2] or "",
+                    full_def=data[3] or "",
+                    example=data[4] or "",
+                    ipas=list(data[5:]),
+                )
+        finally:
+            # a leftover table would make the next call fail
+            self.lemmas_conn.execute("DROP TABLE wanted_senses")
+        return senses
+
+    def get_sense_data(self, sense_ids: tuple[int, ...]) -> list[Sense]:
         if self.lemmas_conn is None:
             return []
-        sql = "SELECT pos, short_def, full_def, example, "
-        if self.gloss_source == "kaikki":
-            if self.lemma_lang == "en":
-                sql += "ga_ipa, rp_ipa "
-            elif self.lemma_lang == "zh":
-                sql += "pinyin, bopomofo "
-            else:
-                sql += "ipa "
-        else:
-            sql += "ipa "
+        sql = f"SELECT pos, short_def, full_def, example, {self.ipa_columns} "
         sql += "FROM senses s JOIN lemmas l ON s.lemma_id = l.id WHERE s.id IN ("
         sql += ",".join("?" * len(sense_ids))
-        sql += ") "
-        if order_by_pos:
-            sql += "ORDER BY pos"
+        sql += ")"
         sense_list: list[Sense] = []
         for data in self.lemmas_conn.execute(sql, sense_ids):
             sense_data = Sense(
@@ -642,6 +728,33 @@ class EPUB:
         return sense_list
 
 
+def read_xhtml(xhtml_path: Path) -> tuple[str, bool]:
+    # remove invisible characters, also return whether any was removed
+    with xhtml_path.open("r", encoding="utf-8") as f:
+        raw_text = f.read()
+    xhtml_text = raw_text.translate(INVISIBLE_CHARS)
+    if "&" in xhtml_text:
+        xhtml_text = INVISIBLE_ENTITIES_RE.sub("", xhtml_text)
+    return xhtml_text, len(xhtml_text) != len(raw_text)
+
+
+def find_text_nodes(
+    xhtml_text: str, xhtml_path: Path
+) -> Iterator[tuple[str, tuple[int, int, Path]]]:
+    body_start = xhtml_text.find("<body")
+    while body_start != -1:
+        body_end = xhtml_text.find("</body>", body_start + 8)
+        if body_end == -1:
+            break
+        body_end += len("</body>")
+        for m in TEXT_NODE_RE.finditer(xhtml_text, body_start, body_end):
+            yield (
+                unescape(m.group(0)[1:-1]),
+                (m.start() + 1, m.end() - 1, xhtml_path),
+            )
+        body_start = xhtml_text.find("<body", body_end)
+
+
 def spacy_to_wiktionary_pos(pos: str) -> str:
     # spaCy POS: https://universaldependencies.org/u/pos
     # Wiktioanry POS: https://github.com/tatuylonen/wiktextract/blob/master/wiktextract/data/en/pos_subtitles.json
@@ -6,14 +6,16 @@ from html import escape
 from pathlib import Path
 from typing import Any
 
+from .database import create_lemmas_indices
+
 
 def extract_apkg(apkg_path: Path) -> dict[str, int]:
     cards = {}
     with zipfile.ZipFile(apkg_path) as zf:
-        db_path = zipfile.Path(zf, "collection.anki21")
-        if not db_path.exists():  # no scheduling information
-            db_path = zipfile.Path(zf, "collection.anki2")
-        ex_db_path = zf.extract(db_path.name, apkg_path.parent)
+        db_name = "collection.anki21"
+        if db_name not in zf.namelist():  # no scheduling information
+            db_name = "collection.anki2"
+        ex_db_path = zf.extract(db_name, apkg_path.parent)
         conn = sqlite3.connect(ex_db_path)
         for card_type, fields in conn.execute(
             "SELECT type, flds FROM cards JOIN notes ON cards.nid = notes.id"
@@ -105,6 +107,7 @@ def apply_imported_lemmas_data(
             return
 
     conn = sqlite3.connect(db_path)
+    create_lemmas_indices(conn)
     for lemma_id, lemma in conn.execute("SELECT id, lemma FROM lemmas"):
         if lemma in lemmas_dict:
             conn.execute(
@@ -8,9 +8,19 @@ from typing import TypedDict
 from urllib.parse import unquote
 
 try:
-    from .x_ray_share import FUZZ_THRESHOLD, PERSON_LABELS, XRayEntity
+    from .x_ray_share import (
+        FUZZ_THRESHOLD,
+        PERSON_LABELS,
+        XRayEntity,
+        rapidfuzz_functions,
+    )
 except ImportError:
-    from x_ray_share import FUZZ_THRESHOLD, PERSON_LABELS, XRayEntity
+    from x_ray_share import (
+        FUZZ_THRESHOLD,
+        PERSON_LABELS,
+        XRayEntity,
+        rapidfuzz_functions,
+    )
 
 # https://www.mediawiki.org/wiki/API:Get_the_contents_of_a_page
 # https://www.mediawiki.org/wiki/Extension:TextExtracts#API
@@ -56,7 +66,8 @@ class MediaWiki:
         if not db_path.parent.exists():
             db_path.parent.mkdir()
 
-        db_conn = sqlite3.connect(db_path)
+        # X_Ray.finish queries in a worker thread
+        db_conn = sqlite3.connect(db_path, check_same_thread=False)
         db_conn.execute(
             """
             CREATE TABLE IF NOT EXISTS pages (
@@ -268,9 +279,8 @@ class MediaWiki:
         self, page: str, from_disambiguation_title: str | None = None
     ) -> None:
         from lxml import etree
-        from rapidfuzz.fuzz import token_set_ratio
-        from rapidfuzz.process import extractOne
-        from rapidfuzz.utils import default_process
+
+        extractOne, token_set_ratio, default_process = rapidfuzz_functions()
 
         # some wikis don't have TextExtract extension
         # https://www.mediawiki.org/wiki/API:Parse
@@ -395,7 +405,7 @@ class Wikidata:
 
     def init_db(self, db_path: Path) -> None:
         create_db = not db_path.exists()
-        self.db_conn = sqlite3.connect(db_path)
+        self.db_conn = sqlite3.connect(db_path, check_same_thread=False)
         if create_db:
             self.db_conn.execute(
                 """
@@ -15,6 +15,7 @@ try:
 
     from .database import (
         create_lang_layer,
+        create_lemmas_indices,
         create_x_ray_db,
         get_ll_path,
         get_x_ray_path,
@@ -54,6 +55,7 @@ except ImportError:
     isfrozen = False
     from database import (
         create_lang_layer,
+        create_lemmas_indices,
         create_x_ray_db,
         get_ll_path,
         get_x_ray_path,
@@ -248,6 +250,8 @@ def create_files(data: ParseJobData, prefs: Prefs, notif: Any) -> None:
             else kindle_db_path(data.plugin_path, data.book_lang, prefs)
         )
         lemmas_conn = sqlite3.connect(lemmas_db_path)
+        # databases downloaded by older versions don't have the indices
+        create_lemmas_indices(lemmas_conn)
         lemma_matcher, phrase_matcher = create_spacy_matcher(
             nlp,
             data.spacy_model,
@@ -289,43 +293,48 @@ def create_files(data: ParseJobData, prefs: Prefs, notif: Any) -> None:
         elif data.create_ww:
             epub = EPUB(data.book_path, None, None, None, None, lemmas_conn)
 
-        for doc, (start, end, xhtml_path) in nlp.pipe(
-            epub.extract_epub(), as_tuples=True
-        ):
-            intervals = []
-            if data.create_x:
-                intervals = find_named_entity(
-                    start,
-                    epub,
-                    doc,
-                    "",
-                    data.book_lang,
-                    None,
-                    custom_x_ray,
-                    xhtml_path,
-                    end,
-                )
-            if data.create_ww:
-                interval_tree = None
-                if len(intervals) > 0:
-                    random.shuffle(intervals)
-                    interval_tree = IntervalTree()
-                    interval_tree.insert_intervals(intervals)
-                epub_find_lemma(
-                    doc,
-                    lemma_matcher,
-                    phrase_matcher,
-                    start,
-                    end,
-                    interval_tree,
-                    epub,
-                    xhtml_path,
-                    prefs["use_pos"],
-                )
-        supported_languages = load_languages_data(data.plugin_path)
-        gloss_lang = prefs["wiktionary_gloss_lang"]
-        gloss_source = supported_languages[gloss_lang]["gloss_source"]
-        epub.modify_epub(prefs, data.book_lang, gloss_lang, gloss_source)
+        # remove the extract folder even if a step fails
+        try:
+            for doc, (start, end, xhtml_path) in nlp.pipe(
+                epub.extract_epub(), as_tuples=True
+            ):
+                intervals = []
+                if data.create_x:
+                    intervals = find_named_entity(
+                        start,
+                        epub,
+                        doc,
+                        "",
+                        data.book_lang,
+                        None,
+                        custom_x_ray,
+                        xhtml_path,
+                        end,
+                    )
+                if data.create_ww:
+                    interval_tree = None
+                    if len(intervals) > 0:
+                        random.shuffle(intervals)
+                        interval_tree = IntervalTree()
+                        interval_tree.insert_intervals(intervals)
+                    epub_find_lemma(
+                        doc,
+                        lemma_matcher,
+                        phrase_matcher,
+                        start,
+                        end,
+                        interval_tree,
+                        epub,
+                        xhtml_path,
+                        prefs["use_pos"],
+                    )
+            supported_languages = load_languages_data(data.plugin_path)
+            gloss_lang = prefs["wiktionary_gloss_lang"]
+            gloss_source = supported_languages[gloss_lang]["gloss_source"]
+            epub.modify_epub(prefs, data.book_lang, gloss_lang, gloss_source)
+        finally:
+            shutil.rmtree(epub.extract_folder, ignore_errors=True)
+            epub.extract_folder.with_suffix(".zip").unlink(missing_ok=True)
         return
 
     # Kindle
@@ -40,8 +40,7 @@ class Prefs(TypedDict):
 
 def load_plugin_json(plugin_path: Path, filepath: str) -> Any:
     with zipfile.ZipFile(plugin_path) as zf:
-        with zipfile.Path(zf, filepath).open(encoding="utf-8") as f:
-            return json.load(f)
+        return json.loads(zf.read(filepath))
 
 
 def run_subprocess(
@@ -127,11 +126,19 @@ def wiktionary_db_path(plugin_path: Path, lemma_lang: str, gloss_lang: str) -> P
 
 def get_kindle_klld_path(plugin_path: Path, zh_gloss: bool = False) -> Path | None:
     custom_folder = custom_lemmas_folder(plugin_path, "en")
-    for path in custom_folder.glob("*.zh.klld" if zh_gloss else "*.en.klld"):
-        return path
-    for path in custom_folder.glob("*.zh.db" if zh_gloss else "*.en.db"):
-        return path
-    return None
+    if not custom_folder.is_dir():
+        return None
+    # scan the folder once, prefer the klld file over the db file
+    lang_suffix = ".zh" if zh_gloss else ".en"
+    db_path = None
+    for path in custom_folder.iterdir():
+        # glob matched case-insensitively on Windows
+        name = path.name.lower()
+        if name.endswith(lang_suffix + ".klld"):
+            return path
+        if db_path is None and name.endswith(lang_suffix + ".db"):
+            db_path = path
+    return db_path
 
 
 def get_wiktionary_klld_path(
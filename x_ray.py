@@ -1,6 +1,6 @@
 import re
 from collections import defaultdict
-from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from sqlite3 import Connection
 
@@ -9,8 +9,8 @@ try:
         create_x_indices,
         insert_x_book_metadata,
         insert_x_entities,
-        insert_x_entity_description,
-        insert_x_excerpt_image,
+        insert_x_entity_descriptions,
+        insert_x_excerpt_images,
         insert_x_occurrences,
         insert_x_types,
         save_db,
@@ -29,14 +29,15 @@ try:
         CustomXDict,
         XRayEntity,
         is_full_name,
+        rapidfuzz_functions,
     )
 except ImportError:
     from database import (
         create_x_indices,
         insert_x_book_metadata,
         insert_x_entities,
-        insert_x_entity_description,
-        insert_x_excerpt_image,
+        insert_x_entity_descriptions,
+        insert_x_excerpt_images,
         insert_x_occurrences,
         insert_x_types,
         save_db,
@@ -55,8 +56,14 @@ except ImportError:
         CustomXDict,
         XRayEntity,
         is_full_name,
+        rapidfuzz_functions,
     )
 
+IMG_TAG_RE = re.compile(b"<img [^>]+/>")
+IMG_SRC_RE = re.compile(b'src="([^"]+)"')
+TEXT_NODE_RE = re.compile(b">[^<]{2,}<")
+HTML_OR_IMG_TAG_RE = re.compile(b"<html|<img")
+
 
 class X_Ray:
     def __init__(
@@ -69,6 +76,8 @@ class X_Ray:
         self.conn = conn
         self.entity_id = 1
         self.entities: dict[str, XRayEntity] = {}
+        # entity name -> name processed for fuzzy matching
+        self.processed_names: dict[str, str] = {}
         self.num_images = 0
         self.mediawiki = mediawiki
         self.wikidata = wikidata
@@ -76,64 +85,63 @@ class X_Ray:
         self.custom_x_ray = custom_x_ray
 
     def insert_descriptions(self, search_people: bool) -> None:
+        descriptions = []
+        # loop invariants
+        get_intro_cache = self.mediawiki.get_cache
+        wikidata = self.wikidata
+        mediawiki_source = 1 if self.mediawiki.is_wikipedia else 2
         for entity_name, entity_data in self.entities.items():
+            entity_id = entity_data.id
             if custom_data := self.custom_x_ray.get(entity_name):
                 if custom_data.desc is not None and len(custom_data.desc) > 0:
-                    insert_x_entity_description(
-                        self.conn,
+                    descriptions.append(
                         (
                             custom_data.desc,
                             entity_name,
                             custom_data.source_id,
-                            entity_data.id,
-                        ),
+                            entity_id,
+                        )
                     )
                     continue
 
             if (search_people or entity_data.label not in PERSON_LABELS) and (
-                intro_cache := self.mediawiki.get_cache(entity_name)
+                intro_cache := get_intro_cache(entity_name)
             ):
                 summary = intro_cache.intro
-                if self.wikidata is not None and (
-                    wikidata_cache := self.wikidata.get_cache(
-                        intro_cache.wikidata_item_id
-                    )
+                if wikidata is not None and (
+                    wikidata_cache := wikidata.get_cache(intro_cache.wikidata_item_id)
                 ):
                     if inception := wikidata_cache.get("inception"):
                         summary += "\n" + inception_text(inception)
-                insert_x_entity_description(
-                    self.conn,
+                descriptions.append(
                     (
                         summary,
                         entity_name,
-                        1 if self.mediawiki.is_wikipedia else 2,
-                        entity_data.id,
-                    ),
+                        mediawiki_source,
+                        entity_id,
+                    )
                 )
             else:
-                insert_x_entity_description(
-                    self.conn, (entity_data.quote, entity_name, None, entity_data.id)
-                )
+                descriptions.append((entity_data.quote, entity_name, None, entity_id))
+        insert_x_entity_descriptions(self.conn, descriptions)
 
     def add_entity(
         self, entity: str, ner_label: str, start: int, quote: str, entity_len: int
     ) -> None:
-        from rapidfuzz.fuzz import token_set_ratio
-        from rapidfuzz.process import extractOne
-        from rapidfuzz.utils import default_process
-
+        extract_one, token_set_ratio, default_process = rapidfuzz_functions()
         if entity_data := self.entities.get(entity):
             entity_id = entity_data.id
             entity_data.count += 1
         elif entity not in self.custom_x_ray and (
-            r := extractOne(
-                entity,
-                self.entities.keys(),
+            r := extract_one(
+                default_process(entity),
+                self.processed_names,
                 score_cutoff=FUZZ_THRESHOLD,
-                scorer=partial(token_set_ratio, processor=default_process),
+                scorer=token_set_ratio,
+                processor=None,
             )
         ):
-            matched_name = r[0]
+            matched_name = r[2]
             matched_entity = self.entities[matched_name]
             matched_entity.count += 1
             entity_id = matched_entity.id
@@ -141,9 +149,12 @@ class X_Ray:
                 # replace partial name with full name
                 self.entities[entity] = self.entities[matched_name]
                 del self.entities[matched_name]
+                self.processed_names[entity] = default_process(entity)
+                del self.processed_names[matched_name]
         else:
             entity_id = self.entity_id
             self.entities[entity] = XRayEntity(entity_id, quote, ner_label, 1)
+            self.processed_names[entity] = default_process(entity)
             self.entity_id += 1
 
         self.entity_occurrences[entity_id].append((start, entity_len))
@@ -166,6 +177,11 @@ class X_Ray:
                 del self.entity_occurrences[entity_data.id]
                 del self.entities[entity_name]
 
+    def query_descriptions(self, search_people: bool) -> None:
+        self.mediawiki.query(self.entities, search_people)
+        if self.wikidata is not None:
+            query_wikidata(self.entities, self.mediawiki, self.wikidata)
+
     def finish(
         self,
         db_path: Path,
@@ -175,60 +191,67 @@ class X_Ray:
         mobi_codec: str,
         prefs: Prefs,
     ) -> None:
-        self.mediawiki.query(self.entities, prefs["search_people"])
-        if self.wikidata is not None:
-            query_wikidata(self.entities, self.mediawiki, self.wikidata)
-        self.merge_entities(prefs["minimal_x_ray_count"])
+        # one transaction for all the inserts, committed before saving
+        with self.conn:
+            # the images don't depend on the entities, find them while the
+            # network requests run in another thread
+            with ThreadPoolExecutor(1) as executor:
+                query_future = executor.submit(
+                    self.query_descriptions, prefs["search_people"]
+                )
+                if kfx_json:
+                    self.find_kfx_images(kfx_json)
+                else:
+                    self.find_mobi_images(mobi_html, mobi_codec)
+                query_future.result()
+            self.merge_entities(prefs["minimal_x_ray_count"])
 
-        insert_x_entities(
-            self.conn,
-            (
+            insert_x_entities(
+                self.conn,
                 (
-                    entity_data.id,
-                    entity_name,
-                    1 if entity_data.label in PERSON_LABELS else 2,
-                    entity_data.count,
-                )
-                for entity_name, entity_data in self.entities.items()
-            ),
-        )
-        insert_x_occurrences(
-            self.conn,
-            (
-                (entity_id, start, entity_length)
-                for entity_id, occurrence_list in self.entity_occurrences.items()
-                for start, entity_length in occurrence_list
-            ),
-        )
-        self.insert_descriptions(prefs["search_people"])
+                    (
+                        entity_data.id,
+                        entity_name,
+                        1 if entity_data.label in PERSON_LABELS else 2,
+                        entity_data.count,
+                    )
+                    for entity_name, entity_data in self.entities.items()
+                ),
+            )
+            insert_x_occurrences(
+                self.conn,
+                (
+                    (entity_id, start, entity_length)
+                    for entity_id, occurrence_list in self.entity_occurrences.items()
+                    for start, entity_length in occurrence_list
+                ),
+            )
+            self.insert_descriptions(prefs["search_people"])
 
-        if kfx_json:
-            self.find_kfx_images(kfx_json)
-        else:
-            self.find_mobi_images(mobi_html, mobi_codec)
-        if self.num_images:
-            preview_images = ",".join(map(str, range(self.num_images)))
-        else:
-            preview_images = None
-        insert_x_book_metadata(
-            self.conn,
-            erl,
-            self.num_images,
-            preview_images,
-        )
-        insert_x_types(self.conn)
-        create_x_indices(self.conn)
+            if self.num_images:
+                preview_images = ",".join(map(str, range(self.num_images)))
+            else:
+                preview_images = None
+            insert_x_book_metadata(
+                self.conn,
+                erl,
+                self.num_images,
+                preview_images,
+            )
+            insert_x_types(self.conn)
+            create_x_indices(self.conn)
         save_db(self.conn, db_path)
         self.mediawiki.close()
         if self.wikidata is not None:
             self.wikidata.close()
 
     def find_kfx_images(self, kfx_json: list[KFXJson]) -> None:
-        images = set()
+        # image content -> image id, setdefault checks and adds in one lookup
+        images: dict[str, int] = {}
+        excerpts = []
         for index, image in filter(lambda x: x[1]["type"] == 2, enumerate(kfx_json)):
-            if image["content"] in images:
+            if images.setdefault(image["content"], self.num_images) != self.num_images:
                 continue
-            images.add(image["content"])
             caption_start = image["position"]
             caption_length = 0
             if (
@@ -239,59 +262,53 @@ class X_Ray:
                 caption = kfx_json[index + 1]
                 caption_start = caption["position"]
                 caption_length = len(caption["content"])
-            insert_x_excerpt_image(
-                self.conn,
+            excerpts.append(
                 (
                     self.num_images,
                     caption_start,
                     caption_length,
                     image["content"],
                     image["position"],
-                ),
+                )
             )
             self.num_images += 1
+        insert_x_excerpt_images(self.conn, excerpts)
 
     def find_mobi_images(self, mobi_html: bytes, mobi_codec: str) -> None:
-        images = set()
-        for match_img in re.finditer(b"<img [^>]+/>", mobi_html):
-            if match_src := re.search(
-                r'src="([^"]+)"', match_img.group(0).decode(mobi_codec)
-            ):
+        images: dict[bytes, int] = {}
+        excerpts = []
+        for match_img in IMG_TAG_RE.finditer(mobi_html):
+            # only decode the src value
+            if match_src := IMG_SRC_RE.search(mobi_html, *match_img.span()):
                 image_src = match_src.group(1)
-                if image_src in images:
+                if images.setdefault(image_src, self.num_images) != self.num_images:
                     continue
-                images.add(image_src)
                 caption_start = match_img.start()
                 caption_length = 0
                 previous_match_end = match_img.end()
                 for _ in range(2):
-                    match_caption = re.search(
-                        b">[^<]{2,}<", mobi_html[previous_match_end:]
-                    )
+                    # search from the offset instead of slicing the rest of the book
+                    match_caption = TEXT_NODE_RE.search(mobi_html, previous_match_end)
                     if not match_caption:
                         break
                     if not match_caption.group(0)[1:-1].strip():
-                        previous_match_end += match_caption.end()
+                        previous_match_end = match_caption.end()
                         continue
-                    if not re.match(
-                        b"<html|<img",
-                        mobi_html[
-                            previous_match_end : previous_match_end
-                            + match_caption.start()
-                        ],
+                    if not HTML_OR_IMG_TAG_RE.match(
+                        mobi_html, previous_match_end, match_caption.start()
                     ):
-                        caption_start = previous_match_end + match_caption.start() + 1
+                        caption_start = match_caption.start() + 1
                         caption_length = match_caption.end() - match_caption.start() - 2
                     break
 
-                insert_x_excerpt_image(
-                    self.conn,
+                excerpts.append(
                     (
                         self.num_images,
                         caption_start,
                         caption_length,
-                        image_src,
+                        image_src.decode(mobi_codec),
                         match_img.start(),
-                    ),
+                    )
                 )
                 self.num_images += 1
+        insert_x_excerpt_images(self.conn, excerpts)
@@ -1,7 +1,9 @@
 import json
 import re
 from dataclasses import dataclass
+from functools import cache
 from pathlib import Path
+from typing import Any
 
 FUZZ_THRESHOLD = 85.7
 
@@ -54,7 +56,17 @@ def is_full_name(
     )
 
 
-@dataclass
+@cache
+def rapidfuzz_functions() -> tuple[Any, Any, Any]:
+    # rapidfuzz is installed with the plugin's libraries, import it on first use
+    from rapidfuzz.fuzz import token_set_ratio
+    from rapidfuzz.process import extractOne
+    from rapidfuzz.utils import default_process
+
+    return extractOne, token_set_ratio, default_process
+
+
+@dataclass(slots=True)
 class XRayEntity:
     id: int
     quote: str